@@ -15,6 +15,7 @@ import requests
 from pkg_resources import parse_version as pv
 from six.moves.urllib.parse import quote
 from tqdm import tqdm
+from urllib3.util.retry import Retry
 
 from . import errors
 from .__about__ import __version__
@@ -24,12 +25,27 @@ from .mixins.channels import ChannelsMixin
 from .mixins.organizations import OrgMixin
 from .mixins.package import PackageMixin
 from .requests_ext import NullAuth
-from .utils import compute_hash, jencode
+from .utils import compute_hash, compute_hashes, jencode, spool_file
 from .utils.http_codes import STATUS_CODES
 from .utils.multipart_uploader import multipart_files_upload
 
 logger = logging.getLogger('binstar')
 
+# Size of the connection pools, large enough for parallel uploads
+POOL_SIZE = 16
+
+
+def _mount_adapters(session):
+    """Reuse connections between requests of a `session`, and retry only the ones that failed to connect."""
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=POOL_SIZE,
+        pool_maxsize=POOL_SIZE,
+        max_retries=Retry(total=3, connect=3, read=False, other=0, status=0, backoff_factor=0.5),
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
 
 class Binstar(OrgMixin, ChannelsMixin, PackageMixin):  # pylint: disable=too-many-public-methods
     """
@@ -43,7 +59,7 @@ class Binstar(OrgMixin, ChannelsMixin, PackageMixin):  # pylint: disable=too-man
             self, token=None, domain='https://api.anaconda.org',
             verify=True, **kwargs
     ):
-        self._session = requests.Session()
+        self._session = _mount_adapters(requests.Session())
         self._session.headers['x-binstar-api-version'] = __version__
         self.session.verify = verify
         self.session.auth = NullAuth()
@@ -60,6 +76,12 @@ class Binstar(OrgMixin, ChannelsMixin, PackageMixin):  # pylint: disable=too-man
         if token:
             self._session.headers.update({'Authorization': 'token {}'.format(token)})
 
+        # Uploads to the storage backend must not send the API headers (including the token), so they use a separate
+        # session, which still keeps the connections open between files. Like the API session it ignores the .netrc,
+        # which requests would otherwise parse again for every uploaded file.
+        self._storage_session = _mount_adapters(requests.Session())
+        self._storage_session.auth = NullAuth()
+
         if domain.endswith('/'):
             domain = domain[:-1]
         if not domain.startswith(('http://', 'https://')):
@@ -527,10 +549,15 @@ class Binstar(OrgMixin, ChannelsMixin, PackageMixin):  # pylint: disable=too-man
 
     def upload(self, login, package_name, release, basename, file, distribution_type,
                description='', md5=None, sha256=None, size=None, dependencies=None, attrs=None,
-               channels=('main',)):
+               channels=('main',), progress=True):
         """
         Upload a new distribution to a package release.
 
+        Unless `sha256` and `md5` are provided, the digests are computed before the upload, as the server requires the
+        sha256 digest when staging it, and the storage backend requires a Content-MD5 form field ahead of the file.
+        Seekable files are read twice: once to compute both digests, and once to upload them. Other streams are read
+        only once, into a spooled copy that is hashed on the way and then uploaded.
+
         :param login: the login of the package owner
         :param package_name: the name of the package
         :param release: the version string of the release
@@ -544,14 +571,30 @@ class Binstar(OrgMixin, ChannelsMixin, PackageMixin):  # pylint: disable=too-man
         :param dependencies: (optional) list package dependencies
         :param attrs: any extra attributes about the file (eg. build=1, pyversion='2.7', os='osx')
         :param channels: list of labels package will be available from
+        :param progress: whether to show a progress bar while the file is uploaded
         """
+        if (None in (md5, sha256, size)) and hasattr(file, 'seekable') and not file.seekable():
+            # Streams can be read only once, so keep a copy of the content while computing the digests
+            spooled, ((sha256, _b64sha256), (_hexmd5, md5)), size = spool_file(file, (hashlib.sha256, hashlib.md5))
+            with spooled:
+                return self.upload(
+                    login, package_name, release, basename, spooled, distribution_type,
+                    description=description, md5=md5, sha256=sha256, size=size, dependencies=dependencies,
+                    attrs=attrs, channels=channels, progress=progress,
+                )
+
         url = '%s/stage/%s/%s/%s/%s' % (self.domain, login, package_name, release, quote(basename))
         if attrs is None:
             attrs = {}
         if not isinstance(attrs, dict):
             raise TypeError('argument attrs must be a dictionary')
 
-        sha256 = sha256 if sha256 is not None else compute_hash(file, size=size, hash_algorithm=hashlib.sha256)[0]
+        if (sha256 is None) and (md5 is None):
+            # Both digests are required, so read the file only once
+            ((sha256, _b64sha256), (_hexmd5, md5)), size = compute_hashes(
+                file, (hashlib.sha256, hashlib.md5), size=size)
+        elif sha256 is None:
+            sha256 = compute_hash(file, size=size, hash_algorithm=hashlib.sha256)[0]
 
         if not isinstance(distribution_type, str):
             distribution_type = distribution_type.value
@@ -574,7 +617,7 @@ class Binstar(OrgMixin, ChannelsMixin, PackageMixin):  # pylint: disable=too-man
         s3data = obj['form_data']
 
         if md5 is None:
-            _hexmd5, b64md5, size = compute_hash(file, size=size)
+            _hexmd5, md5, size = compute_hash(file, size=size)
         elif size is None:
             spos = file.tell()
             file.seek(0, os.SEEK_END)
@@ -582,13 +625,12 @@ class Binstar(OrgMixin, ChannelsMixin, PackageMixin):  # pylint: disable=too-man
             file.seek(spos)
 
         s3data['Content-Length'] = str(size)
-        s3data['Content-MD5'] = b64md5
+        s3data['Content-MD5'] = md5
 
-        file_size = os.fstat(file.fileno()).st_size
-        with tqdm(total=file_size, unit='B', unit_scale=True, unit_divisor=1024) as progress:
+        with tqdm(total=size, unit='B', unit_scale=True, unit_divisor=1024, disable=not progress) as progress_bar:
             s3res = multipart_files_upload(
-                s3url, s3data, {'file': (basename, file)}, progress,
-                verify=self.session.verify)
+                s3url, s3data, {'file': (basename, file)}, progress_bar,
+                session=self._storage_session, verify=self.session.verify)
 
         if s3res.status_code != 201:
             logger.info(s3res.text)
@@ -18,22 +18,50 @@
 from __future__ import unicode_literals
 
 import argparse
+import collections
+import contextlib
+import itertools
 import logging
 import os
+import threading
+from concurrent import futures
 from glob import glob
 from os.path import exists
 
-import nbformat
 from six.moves import input
 
 from binstar_client import errors
-from binstar_client.utils import bool_input, DEFAULT_CONFIG, get_config, get_server_api
+from binstar_client.utils import bool_input, DEFAULT_CONFIG, get_config, get_server_api, MappedFile
 from binstar_client.utils.config import PackageType
 from binstar_client.utils.detect import detect_package_type, get_attrs
 from binstar_client.utils.projects import upload_project
 
 logger = logging.getLogger('binstar.upload')
 
+# Groups of package types which can be uploaded to the same package
+COMPATIBLE_PACKAGE_GROUPS = (
+    frozenset({PackageType.CONDA, PackageType.STANDARD_PYTHON}),
+)
+
+# Package types which can be uploaded to a package already containing files of a key type
+COMPATIBLE_PACKAGE_TYPES = {
+    package_type: frozenset({package_type}).union(*(
+        group for group in COMPATIBLE_PACKAGE_GROUPS if package_type in group
+    ))
+    for package_type in PackageType
+}
+
+# Canonical package type values, looked up directly instead of going through the Enum call machinery
+_PKGTYPE_BY_VALUE = {package_type.value: package_type for package_type in PackageType}
+
+
+def _package_type(value):
+    """Resolve a package type value, falling back to :class:`PackageType` itself for aliases and errors."""
+    try:
+        return _PKGTYPE_BY_VALUE[value]
+    except KeyError:
+        return PackageType(value)
+
 
 def verbose_package_type(pkg_type, lowercase=True):
     verbose_type = pkg_type.label()
@@ -71,7 +99,7 @@ def determine_package_type(filename, args):
     -t/--package-type argument
     """
     if args.package_type:
-        return PackageType(args.package_type)
+        return _package_type(args.package_type)
 
     logger.info('Detecting file type...')
     package_type = detect_package_type(filename)
@@ -125,9 +153,13 @@ def get_version(args, release_attrs, package_type):
 
 
 def add_package(aserver_api, args, username,  # pylint: disable=too-many-arguments
-                package_name, package_attrs, package_type):
+                package_name, package_attrs, package_type, package_cache=None):
+    key = (username, package_name)
+    if (package_cache is not None) and (key in package_cache):
+        return package_cache[key]
+
     try:
-        return aserver_api.package(username, package_name)
+        package = aserver_api.package(username, package_name)
     except errors.NotFound as not_found_error:
         if not args.auto_register:
             message = (
@@ -150,7 +182,7 @@ def add_package(aserver_api, args, username,  # pylint: disable=too-many-argumen
 
         public = not args.private
 
-        return aserver_api.add_package(
+        package = aserver_api.add_package(
             username,
             package_name,
             summary,
@@ -162,12 +194,18 @@ def add_package(aserver_api, args, username,  # pylint: disable=too-many-argumen
             package_type=package_type,
         )
 
+    if package_cache is not None:
+        package_cache[key] = package
+    return package
+
 
 def add_release(aserver_api, args, username,  # pylint: disable=too-many-arguments
-                package_name, version, release_attrs):
+                package_name, version, release_attrs, package_cache=None):
+    key = (username, package_name, version)
     try:
         # Check if the release already exists
-        aserver_api.release(username, package_name, version)
+        if (package_cache is None) or (key not in package_cache):
+            aserver_api.release(username, package_name, version)
 
         # If it exists update public attrs if needed.
         if args.force_metadata_update:
@@ -178,6 +216,9 @@ def add_release(aserver_api, args, username,  # pylint: disable=too-many-argumen
         else:
             create_release(aserver_api, username, package_name, version, release_attrs)
 
+    if package_cache is not None:
+        package_cache[key] = True
+
 
 def remove_existing_file(aserver_api, args,  # pylint: disable=too-many-arguments,inconsistent-return-statements
                          username, package_name, version, file_attrs):
@@ -198,22 +239,63 @@ def remove_existing_file(aserver_api, args,  # pylint: disable=too-many-argument
             return True
 
 
-def upload_package(filename, package_type,  # pylint: disable=inconsistent-return-statements,too-many-locals
-                   aserver_api, username, args):
-    logger.info('Extracting %s attributes for upload', verbose_package_type(package_type))
+def read_package_attrs(filename, package_type, args):
+    """
+    Extract package, release and file attributes from `filename`.
 
+    :return: Tuple of package, release and file attributes, or :code:`None` if the file should be skipped.
+    """
     try:
-        package_attrs, release_attrs, file_attrs = get_attrs(package_type, filename, parser_args=args)
+        return get_attrs(package_type, filename, parser_args=args)
     except Exception as error:
-        message = 'Trouble reading metadata from {}. Is this a valid {} package?'.format(
-            filename, verbose_package_type(package_type)
-        )
-        logger.error(message)
+        # Notebooks are validated while their metadata is extracted, so the file is parsed only once. Only parsing
+        # failures mean the notebook is invalid: nbformat.reader.NotJSONError and NBFormatError are ValueErrors too.
+        if (package_type is PackageType.NOTEBOOK) and isinstance(error, ValueError) and (args.mode != 'force'):
+            logger.error("Invalid notebook file '%s': %s", filename, error)
+            logger.info('Use --force to upload the file anyways')
+            return None
+
+        message = 'Trouble reading metadata from %s. Is this a valid %s package?'
+        message_args = (filename, verbose_package_type(package_type))
+        logger.error(message, *message_args)
 
         if args.show_traceback:
             raise
 
-        raise errors.BinstarError(message) from error
+        raise errors.BinstarError(message % message_args) from error
+
+
+@contextlib.contextmanager
+def _open_package_file(filename):
+    """
+    Open a package file for upload.
+
+    The file is memory-mapped when possible, so it is hashed and uploaded from the same mapping instead of being read
+    through separate buffers for each pass.
+    """
+    with open(filename, 'rb') as file:
+        try:
+            mapped_file = MappedFile(file)
+        except (OSError, ValueError):
+            # Empty and special files can not be mapped
+            mapped_file = None
+
+        if mapped_file is None:
+            yield file
+            return
+
+        with mapped_file:
+            yield mapped_file
+
+
+def upload_package(  # pylint: disable=inconsistent-return-statements,too-many-locals,too-many-arguments
+        filename, package_type, aserver_api, username, args, package_locks=None, package_cache=None):
+    logger.info('Extracting %s attributes for upload', verbose_package_type(package_type))
+
+    attrs = read_package_attrs(filename, package_type, args)
+    if attrs is None:
+        return None
+    package_attrs, release_attrs, file_attrs = attrs
 
     if args.build_id:
         file_attrs['attrs']['binstar_build'] = args.build_id
@@ -227,27 +309,27 @@ def upload_package(filename, package_type,  # pylint: disable=inconsistent-retur
     package_name = get_package_name(args, package_attrs, package_type)
     version = get_version(args, release_attrs, package_type)
 
-    logger.info('Creating package "%s"', package_name)
+    # Serialize the NotFound -> create sequence, so concurrent uploads of the same package do not register it twice
+    package_lock = package_locks[username, package_name] if package_locks is not None else contextlib.nullcontext()
+    with package_lock:
+        logger.info('Creating package "%s"', package_name)
 
-    package = add_package(aserver_api, args, username, package_name, package_attrs, package_type)
-    package_types = [PackageType(pkg_type) for pkg_type in package.get('package_types', [])]
+        package = add_package(aserver_api, args, username, package_name, package_attrs, package_type, package_cache)
+        package_types = [_package_type(pkg_type) for pkg_type in package.get('package_types') or ()]
 
-    allowed_package_types = set(package_types)
-    for group in [{PackageType.CONDA, PackageType.STANDARD_PYTHON}]:
-        if allowed_package_types & group:
-            allowed_package_types.update(group)
+        if package_types and not any(
+                package_type in COMPATIBLE_PACKAGE_TYPES[existing_type] for existing_type in package_types):
+            message = 'You already have a {} named \'{}\'. Use a different name for this {}.'.format(
+                verbose_package_type(package_types[0] if package_types else ''), package_name,
+                verbose_package_type(package_type),
+            )
+            logger.error(message)
+            raise errors.BinstarError(message)
 
-    if package_types and (package_type not in allowed_package_types):
-        message = 'You already have a {} named \'{}\'. Use a different name for this {}.'.format(
-            verbose_package_type(package_types[0] if package_types else ''), package_name,
-            verbose_package_type(package_type),
-        )
-        logger.error(message)
-        raise errors.BinstarError(message)
+        logger.info('Creating release "%s"', version)
 
-    logger.info('Creating release "%s"', version)
+        add_release(aserver_api, args, username, package_name, version, release_attrs, package_cache)
 
-    add_release(aserver_api, args, username, package_name, version, release_attrs)
     binstar_package_type = file_attrs.pop('binstar_package_type', package_type)
 
     logger.info('Uploading file "%s/%s/%s/%s"', username, package_name, version, file_attrs['basename'])
@@ -256,11 +338,11 @@ def upload_package(filename, package_type,  # pylint: disable=inconsistent-retur
         return
 
     try:
-        with open(filename, 'rb') as file:
+        with _open_package_file(filename) as file:
             upload_info = aserver_api.upload(username, package_name, version, file_attrs['basename'], file,
                                              binstar_package_type, args.description,
                                              dependencies=file_attrs.get('dependencies'), attrs=file_attrs['attrs'],
-                                             channels=args.labels)
+                                             channels=args.labels, progress=not args.no_progress)
     except errors.Conflict:
         upload_info = {}
         if args.mode != 'skip':
@@ -275,6 +357,15 @@ def upload_package(filename, package_type,  # pylint: disable=inconsistent-retur
             )
             raise
         logger.info('Distribution already exists. Skipping upload.\n')
+    else:
+        with package_lock:
+            # Keep the cached package in line with the server, which now lists the type the file was uploaded as
+            uploaded_type = binstar_package_type
+            if not isinstance(uploaded_type, str):
+                uploaded_type = uploaded_type.value
+            package_types = package.setdefault('package_types', [])
+            if uploaded_type not in package_types:
+                package_types.append(uploaded_type)
 
     if upload_info:
         logger.info('Upload complete\n')
@@ -282,9 +373,85 @@ def upload_package(filename, package_type,  # pylint: disable=inconsistent-retur
     return [package_name, upload_info]
 
 
+def _process_one(filename, aserver_api, username, args,  # pylint: disable=too-many-arguments
+                 package_locks=None, package_cache=None):
+    """
+    Upload a single file.
+
+    :return: ``('project', (project_name, url))``, ``('package', (package_name, upload_info, package_type))`` or
+             ``(None, None)`` if nothing was uploaded.
+    """
+    if not exists(filename):
+        message = 'File "{}" does not exist'.format(filename)
+        logger.error(message)
+        raise errors.BinstarError(message)
+    logger.info("Processing '%s'", filename)
+
+    package_type = determine_package_type(filename, args)
+
+    if package_type is PackageType.PROJECT:
+        return 'project', upload_project(filename, args, username)
+
+    package_info = upload_package(
+        filename,
+        package_type=package_type,
+        aserver_api=aserver_api,
+        username=username,
+        args=args,
+        package_locks=package_locks,
+        package_cache=package_cache)
+
+    if package_info is not None and len(package_info) == 2:
+        _package, _upload_info = package_info
+        if _upload_info:
+            return 'package', (_package, _upload_info, package_type)
+
+    return None, None
+
+
+def _process_files(files, aserver_api, username, args):
+    """
+    Yield :func:`_process_one` results for each of the `files`, using a pool of workers if requested.
+
+    Workers are threads rather than coroutines: the upload pipeline is built on :mod:`requests`, and both hashing and
+    network transfers release the GIL, so metadata extraction, hashing and uploads of different files already overlap.
+    """
+    max_workers = args.parallel or min(8, len(files))
+
+    if (max_workers > 1) and (args.mode == 'interactive'):
+        logger.warning('Interactive mode does not support parallel uploads. Uploading files one by one.')
+        max_workers = 1
+
+    # Packages and releases already known to exist on the server, so the lookups are done once per package/release
+    # instead of once per file: {(username, package_name): package, (username, package_name, version): True}
+    package_cache = {}
+
+    if (max_workers <= 1) or (len(files) <= 1):
+        for filename in files:
+            yield _process_one(filename, aserver_api, username, args, package_cache=package_cache)
+        return
+
+    # Progress bars of concurrent uploads would overwrite each other
+    args = argparse.Namespace(**{**vars(args), 'no_progress': True})
+
+    package_locks = collections.defaultdict(threading.Lock)
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = [
+            executor.submit(_process_one, filename, aserver_api, username, args, package_locks, package_cache)
+            for filename in files
+        ]
+        try:
+            for future in futures.as_completed(pending):
+                yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
 def main(args):  # pylint: disable=too-many-branches,too-many-locals
     config = get_config(site=args.site)
 
+    # A single API client (and its connection pool) is shared by all uploaded files, so the server is checked only once
     aserver_api = get_server_api(token=args.token, site=args.site, config=config)
     aserver_api.check_server()
 
@@ -313,40 +480,13 @@ def main(args):  # pylint: disable=too-many-branches,too-many-locals
     uploaded_projects = []
 
     # Flatten file list because of 'windows_glob' function
-    files = sorted(set(fitem for fglob in args.files for fitem in fglob))
-
-    for filename in files:
-        if not exists(filename):
-            message = 'File "{}" does not exist'.format(filename)
-            logger.error(message)
-            raise errors.BinstarError(message)
-        logger.info("Processing '%s'", filename)
+    files = sorted(set(itertools.chain.from_iterable(args.files)))
 
-        package_type = determine_package_type(filename, args)
-
-        if package_type is PackageType.PROJECT:
-            uploaded_projects.append(upload_project(filename, args, username))
-        else:
-            if package_type is PackageType.NOTEBOOK and not args.mode == 'force':
-                try:
-                    with open(filename, 'rt', encoding='utf-8') as stream:
-                        nbformat.read(stream, nbformat.NO_CONVERT)
-                except Exception as error:  # pylint: disable=broad-except
-                    logger.error("Invalid notebook file '%s': %s", filename, error)
-                    logger.info('Use --force to upload the file anyways')
-                    continue
-
-            package_info = upload_package(
-                filename,
-                package_type=package_type,
-                aserver_api=aserver_api,
-                username=username,
-                args=args)
-
-            if package_info is not None and len(package_info) == 2:
-                _package, _upload_info = package_info
-                if _upload_info:
-                    uploaded_packages.append((_package, _upload_info, package_type))
+    for kind, payload in _process_files(files, aserver_api, username, args):
+        if kind == 'project':
+            uploaded_projects.append(payload)
+        elif kind == 'package':
+            uploaded_packages.append(payload)
 
     for package, upload_info, package_type in uploaded_packages:
         package_url = upload_info.get('url', 'https://anaconda.org/%s/%s' % (username, package))
@@ -362,6 +502,13 @@ def pathname_list(item):
     return [item]
 
 
+def worker_count(value):
+    count = int(value)
+    if count < 0:
+        raise argparse.ArgumentTypeError('expected 0 or a positive number of workers, got {}'.format(value))
+    return count
+
+
 def add_parser(subparsers):
     description = 'Upload packages to your Anaconda repository'
     parser = subparsers.add_parser(
@@ -401,6 +548,13 @@ def add_parser(subparsers):
         '-u', '--user',
         help='User account or Organization, defaults to the current user',
     )
+    parser.add_argument(
+        '--parallel',
+        default=1,
+        type=worker_count,
+        metavar='N',
+        help='Upload up to N files at the same time. Use 0 to pick the number of workers automatically',
+    )
 
     mgroup = parser.add_argument_group('metadata options')
     mgroup.add_argument(
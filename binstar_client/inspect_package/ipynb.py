@@ -6,7 +6,7 @@ import os
 import re
 from datetime import datetime
 
-import nbformat
+import nbformat.reader
 
 from ..utils.notebook.data_uri import data_uri_from
 from ..utils.notebook.inflection import parameterize
@@ -14,7 +14,12 @@ from ..utils.notebook.inflection import parameterize
 
 def inspect_ipynb_package(filename, fileobj, *args, **kwargs):  # pylint: disable=unused-argument
 
-    notebook = nbformat.read(fileobj, nbformat.NO_CONVERT)
+    # Only the metadata is needed, so skip the schema validation :func:`nbformat.read` would perform
+    try:
+        notebook = nbformat.reader.read(fileobj)
+    except (AttributeError, TypeError) as error:
+        # nbformat expects the notebook to be a JSON object, and fails on other values
+        raise ValueError('Notebook is not a JSON object') from error
     summary = notebook.get('metadata', {}).get('summary', 'Jupyter Notebook')
     description = notebook.get('metadata', {}).get('description', 'Jupyter Notebook')
 
@@ -3,9 +3,15 @@
 from __future__ import print_function, absolute_import, unicode_literals
 
 import base64
+import hashlib
+import io
 import json
 import logging
+import mmap
+import os
+import shutil
 import sys
+import tempfile
 from hashlib import md5
 
 from six.moves import input
@@ -20,6 +26,9 @@ from .spec import PackageSpec, package_specs, parse_specs
 
 logger = logging.getLogger('binstar')
 
+# :func:`hashlib.file_digest` is available since Python 3.11
+_file_digest = getattr(hashlib, 'file_digest', None)
+
 # Compatibility layer for :func:`base64.encodestring` / :func:`base64.encodebytes` function
 #
 # :func:`~base64.encodestring` was replaced by :func:`~base64.encodebytes` in Python 3.1, as well as deprecated.
@@ -56,47 +65,227 @@ def jencode(*E, **F):
     return json.dumps(payload), {'Content-Type': 'application/json'}
 
 
-def compute_hash(file, buf_size=8192, size=None, hash_algorithm=md5):
-    hash_obj = hash_algorithm()
+def _digests(hash_objs):
+    return tuple(
+        (hash_obj.hexdigest(), b64encode(hash_obj.digest()).rstrip('\n'))
+        for hash_obj in hash_objs
+    )
+
+
+class _ContentFile:
+    """
+    Base of the read-only binary file-like objects reading back `content` held by another object.
+
+    Subclasses report the number of bytes left to read as :attr:`len`, which is what :mod:`requests_toolbelt` expects
+    from file-like objects without a file descriptor.
+
+    :param content: Object holding the content, with ``read``, ``seek``, ``tell`` and ``close`` methods. It is closed
+                    along with this object.
+    """
+
+    def __init__(self, content):
+        self.content = content
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def len(self):
+        raise NotImplementedError()
+
+    def close(self):
+        self.content.close()
+
+    def read(self, size=-1):
+        return self.content.read(size)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self.content.seek(offset, whence)
+        return self.content.tell()
+
+    def tell(self):
+        return self.content.tell()
+
+    def seekable(self):
+        return True
+
+
+class MappedFile(_ContentFile):
+    """
+    Read-only binary file-like object backed by a memory-mapped file.
+
+    Unlike :class:`mmap.mmap`, :attr:`~MappedFile.len` reports the number of bytes left to read.
+
+    :param file: Binary file object to map. It must stay open while this object is in use.
+    """
+
+    def __init__(self, file):
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            mapping.madvise(mmap.MADV_SEQUENTIAL)
+        super().__init__(mapping)
+        self.name = getattr(file, 'name', None)
+
+    @property
+    def len(self):
+        return len(self.content) - self.content.tell()
+
+
+class SpooledFile(_ContentFile):
+    """
+    Binary file-like object reading back content copied into a :class:`tempfile.SpooledTemporaryFile`.
+
+    Without :attr:`~SpooledFile.len`, :mod:`requests_toolbelt` would call ``fileno()`` to find the size, which moves the
+    content to disk.
+
+    :param spooled: Temporary file holding the content, positioned at its start. It is closed along with this object.
+    :param size: Number of bytes in the temporary file.
+    """
+
+    def __init__(self, spooled, size):
+        super().__init__(spooled)
+        self.size = size
+
+    @property
+    def len(self):
+        return self.size - self.content.tell()
+
+
+class HashingFileWrapper:
+    """
+    Binary file-like object computing digests of the content read through it.
+
+    :param file: Binary file-like object to read content from.
+    :param hash_algorithms: Constructors of :mod:`hashlib` compatible hash objects.
+    """
+
+    def __init__(self, file, hash_algorithms=(md5,)):
+        self.file = file
+        self.hash_objs = [hash_algorithm() for hash_algorithm in hash_algorithms]
+
+    def read(self, size=-1):
+        chunk = self.file.read(size)
+        for hash_obj in self.hash_objs:
+            hash_obj.update(chunk)
+        return chunk
+
+    def digests(self):
+        """
+        Digests of the content read so far.
+
+        :return: Tuple of ``(hex_digest, base64_digest)`` pairs, one for each of the hash algorithms.
+        """
+        return _digests(self.hash_objs)
+
+
+def compute_hashes(file, hash_algorithms, buf_size=1 << 20, size=None):
+    """
+    Compute several digests of the `file` content in a single pass, starting from its current position.
+
+    The position of the `file` is restored afterwards.
+
+    :param file: Binary file-like object or :class:`~MappedFile` to compute digests for.
+    :param hash_algorithms: Constructors of :mod:`hashlib` compatible hash objects.
+    :param buf_size: Number of bytes to read at once.
+    :param size: Number of bytes to compute digests for. The whole file is used if not set.
+    :return: Tuple of ``(hex_digest, base64_digest)`` pairs (one for each of `hash_algorithms`), and number of bytes
+             read.
+    """
     spos = file.tell()
-    if size and size < buf_size:
-        chunk = file.read(size)
+
+    if isinstance(file, MappedFile):
+        # Hash slices of the mapping directly, without copying them into intermediate buffers
+        epos = len(file.content) if not size else min(len(file.content), spos + size)
+        hash_objs = [hash_algorithm() for hash_algorithm in hash_algorithms]
+        with memoryview(file.content) as view:
+            for offset in range(spos, epos, buf_size):
+                chunk = view[offset:min(offset + buf_size, epos)]
+                for hash_obj in hash_objs:
+                    hash_obj.update(chunk)
+        file.seek(epos)
+    elif (not size) and (_file_digest is not None) and isinstance(file, io.BufferedReader) and \
+            (len(hash_algorithms) == 1):
+        # Read and update loop is implemented in C
+        hash_objs = [_file_digest(file, hash_algorithms[0])]
     else:
-        chunk = file.read(buf_size)
-    while chunk:
-        hash_obj.update(chunk)
-        if size:
-            size -= len(chunk)
-            if size <= 0:
+        # With large chunks, the bookkeeping below is negligible compared to hashing the chunks themselves
+        hash_objs = [hash_algorithm() for hash_algorithm in hash_algorithms]
+        remaining = size
+        while True:
+            chunk = file.read(min(remaining, buf_size) if remaining else buf_size)
+            if not chunk:
                 break
-        if size and size < buf_size:
-            chunk = file.read(size)
-        else:
-            chunk = file.read(buf_size)
-    hex_digest = hash_obj.hexdigest()
+            for hash_obj in hash_objs:
+                hash_obj.update(chunk)
+            if remaining:
+                remaining -= len(chunk)
+                if remaining <= 0:
+                    break
 
-    base64_digest = b64encode(hash_obj.digest()).rstrip('\n')
+    digests = _digests(hash_objs)
 
     # data_size based on bytes read.
     data_size = file.tell() - spos
     file.seek(spos)
+    return digests, data_size
+
+
+def spool_file(file, hash_algorithms, buf_size=1 << 20, max_size=64 << 20):
+    """
+    Copy the remaining content of a non-seekable `file` into a temporary file, computing its digests along the way.
+
+    This way the content may be read again (e.g. to be uploaded), and the source is still read only once.
+
+    :param file: Binary file-like object to copy content from.
+    :param hash_algorithms: Constructors of :mod:`hashlib` compatible hash objects.
+    :param buf_size: Number of bytes to read at once.
+    :param max_size: Content larger than this is kept on disk instead of in memory.
+    :return: Tuple of the :class:`~SpooledFile` (positioned at its start), ``(hex_digest, base64_digest)`` pairs
+             (one for each of `hash_algorithms`), and number of bytes copied.
+    """
+    wrapper = HashingFileWrapper(file, hash_algorithms)
+    spooled = tempfile.SpooledTemporaryFile(max_size=max_size)  # pylint: disable=consider-using-with
+    try:
+        shutil.copyfileobj(wrapper, spooled, buf_size)
+        size = spooled.tell()
+        spooled.seek(0)
+    except BaseException:
+        spooled.close()
+        raise
+    return SpooledFile(spooled, size), wrapper.digests(), size
+
+
+def compute_hash(file, buf_size=1 << 20, size=None, hash_algorithm=md5):
+    """
+    Compute the digest of the `file` content, starting from its current position.
+
+    The position of the `file` is restored afterwards.
+
+    :param file: Binary file-like object or :class:`~MappedFile` to compute digest for.
+    :param buf_size: Number of bytes to read at once.
+    :param size: Number of bytes to compute digest for. The whole file is used if not set.
+    :param hash_algorithm: Constructor of a :mod:`hashlib` compatible hash object.
+    :return: Tuple of hexadecimal digest, base64-encoded digest, and number of bytes read.
+    """
+    ((hex_digest, base64_digest),), data_size = compute_hashes(file, (hash_algorithm,), buf_size=buf_size, size=size)
     return (hex_digest, base64_digest, data_size)
 
 
+_BOOL_ANSWERS = {'y': True, 'yes': True, 'n': False, 'no': False}
+
+
 def bool_input(prompt, default=True):
     default_str = '[Y|n]' if default else '[y|N]'
     while True:
-        inpt = input('%s %s: ' % (prompt, default_str))
-        if inpt.lower() in ['y', 'yes'] and not default:  # pylint: disable=no-else-return
-            return True
-        elif inpt.lower() in ['', 'n', 'no'] and not default:
-            return False
-        elif inpt.lower() in ['', 'y', 'yes']:
-            return True
-        elif inpt.lower() in ['n', 'no']:
-            return False
-        else:
-            sys.stderr.write('please enter yes or no\n')
+        inpt = input('%s %s: ' % (prompt, default_str)).strip().lower()
+        if not inpt:
+            return default
+        if inpt in _BOOL_ANSWERS:
+            return _BOOL_ANSWERS[inpt]
+        sys.stderr.write('please enter yes or no\n')
 
 
 WAIT_SECONDS = 15
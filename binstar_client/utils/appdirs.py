@@ -18,6 +18,7 @@ __version_info__ = (1, 2, 0)
 __version__ = '.'.join(map(str, __version_info__))
 
 
+import functools
 import sys
 import os
 
@@ -26,6 +27,7 @@ class AppDirsError(Exception):
     pass
 
 
+@functools.lru_cache(maxsize=32)
 def user_data_dir(appname, appauthor=None, version=None, roaming=False):
     r"""Return full path to the user-specific data dir for this application.
 
@@ -59,20 +61,10 @@ def user_data_dir(appname, appauthor=None, version=None, roaming=False):
     Also, in practice, Linux apps tend to store their data in
     "~/.config/<appname>" instead of "~/.local/share/<appname>".
     """
-    if sys.platform.startswith('win'):
-        if appauthor is None:
-            raise AppDirsError('must specify \'appauthor\' on Windows')
-        const = roaming and 'CSIDL_APPDATA' or 'CSIDL_LOCAL_APPDATA'  # pylint: disable=consider-using-ternary
-        path = os.path.join(_get_win_folder(const), appauthor, appname)
-    elif sys.platform == 'darwin':
-        path = os.path.join(os.path.expanduser('~/Library/Application Support/'), appname)
-    else:
-        path = os.path.join(os.getenv('XDG_CONFIG_HOME', os.path.expanduser('~/.config')), appname.lower())
-    if version:
-        path = os.path.join(path, version)
-    return path
+    return _user_data_dir(appname, appauthor, version, roaming)
 
 
+@functools.lru_cache(maxsize=32)
 def site_data_dir(appname, appauthor=None, version=None):
     """Return full path to the user-shared data dir for this application.
 
@@ -96,20 +88,10 @@ def site_data_dir(appname, appauthor=None, version=None):
 
     WARNING: Do not use this on Windows. See the Vista-Fail note above for why.
     """
-    if sys.platform.startswith('win'):
-        if appauthor is None:
-            raise AppDirsError('must specify \'appauthor\' on Windows')
-        path = os.path.join(_get_win_folder('CSIDL_COMMON_APPDATA'), appauthor, appname)
-    elif sys.platform == 'darwin':
-        path = os.path.join(os.path.expanduser('/Library/Application Support'), appname)
-    else:
-        # XDG default for $XDG_CONFIG_DIRS[0]. Perhaps should actually *use* that envvar, if defined.
-        path = '/etc/xdg/' + appname.lower()
-    if version:
-        path = os.path.join(path, version)
-    return path
+    return _site_data_dir(appname, appauthor, version)
 
 
+@functools.lru_cache(maxsize=32)
 def user_cache_dir(appname, appauthor=None, version=None, opinion=True):
     r"""Return full path to the user-specific cache dir for this application.
 
@@ -140,21 +122,10 @@ def user_cache_dir(appname, appauthor=None, version=None, opinion=True):
     OPINION: This function appends "Cache" to the `CSIDL_LOCAL_APPDATA` value.
     This can be disabled with the `opinion=False` option.
     """
-    if sys.platform.startswith('win'):
-        if appauthor is None:
-            raise AppDirsError('must specify \'appauthor\' on Windows')
-        path = os.path.join(_get_win_folder('CSIDL_LOCAL_APPDATA'), appauthor, appname)
-        if opinion:
-            path = os.path.join(path, 'Cache')
-    elif sys.platform == 'darwin':
-        path = os.path.join(os.path.expanduser('~/Library/Caches'), appname)
-    else:
-        path = os.path.join(os.getenv('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), appname.lower())
-    if version:
-        path = os.path.join(path, version)
-    return path
+    return _user_cache_dir(appname, appauthor, version, opinion)
 
 
+@functools.lru_cache(maxsize=32)
 def user_log_dir(appname, appauthor=None, version=None, opinion=True):
     r"""Return full path to the user-specific log dir for this application.
 
@@ -184,49 +155,53 @@ def user_log_dir(appname, appauthor=None, version=None, opinion=True):
     value for Windows and appends "log" to the user cache dir for Unix.
     This can be disabled with the `opinion=False` option.
     """
+    return _user_log_dir(appname, appauthor, version, opinion)
+
+
+def _clear_caches():
+    """Forget the memoized directories, e.g. after the environment or home directory has changed."""
+    functions = (user_data_dir, site_data_dir, user_cache_dir, user_log_dir, _get_win_folder, _shell32_get_folder_path)
+    for function in functions:
+        function.cache_clear()
+
+
+def _reset_env_cache():
+    """Read the base directories from the environment again, e.g. after $HOME or the XDG variables have changed."""
+    global _DARWIN_APP_SUPPORT, _DARWIN_CACHES, _DARWIN_LOGS  # pylint: disable=global-statement
+    global _XDG_CONFIG_HOME, _XDG_CACHE_HOME  # pylint: disable=global-statement
+
     if sys.platform == 'darwin':
-        path = os.path.join(os.path.expanduser('~/Library/Logs'), appname)
-    elif sys.platform == 'win32':
-        path = user_data_dir(appname, appauthor, version)
-        version = False
-        if opinion:
-            path = os.path.join(path, 'Logs')
-    else:
-        path = user_cache_dir(appname, appauthor, version)
-        version = False
-        if opinion:
-            path = os.path.join(path, 'log')
-    if version:
-        path = os.path.join(path, version)
-    return path
-
-
-class EnvAppDirs:
+        _DARWIN_APP_SUPPORT = os.path.expanduser('~/Library/Application Support/')
+        _DARWIN_CACHES = os.path.expanduser('~/Library/Caches')
+        _DARWIN_LOGS = os.path.expanduser('~/Library/Logs')
+    elif sys.platform != 'win32':
+        # Without trailing separators, so the paths can be built by plain string formatting
+        _XDG_CONFIG_HOME = (os.getenv('XDG_CONFIG_HOME') or os.path.expanduser('~/.config')).rstrip('/')
+        _XDG_CACHE_HOME = (os.getenv('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')).rstrip('/')
+
+    _clear_caches()
+
+
+class EnvAppDirs:  # pylint: disable=too-few-public-methods
 
     def __init__(self, appname, appauthor, root_path):
         self.appname = appname
         self.appauthor = appauthor
         self.root_path = root_path
 
-    @property
-    def user_data_dir(self):
-        return os.path.join(self.root_path, 'data')
-
-    @property
-    def site_data_dir(self):
-        return os.path.join(self.root_path, 'data')
-
-    @property
-    def user_cache_dir(self):
-        return os.path.join(self.root_path, 'cache')
-
-    @property
-    def user_log_dir(self):
-        return os.path.join(self.root_path, 'log')
+        self.user_data_dir = self.site_data_dir = os.path.join(root_path, 'data')
+        self.user_cache_dir = os.path.join(root_path, 'cache')
+        self.user_log_dir = os.path.join(root_path, 'log')
 
 
 class AppDirs:
-    """Convenience wrapper for getting application dirs."""
+    """
+    Convenience wrapper for getting application dirs.
+
+    Instances are meant to be immutable: all directories are computed together on first access and then kept. The
+    module-level functions are memoized as well, so the paths (including the lower-cased `appname` used on Unix) are
+    built once per set of arguments.
+    """
 
     def __init__(self, appname, appauthor, version=None, roaming=False):
         self.appname = appname
@@ -234,25 +209,131 @@ class AppDirs:
         self.version = version
         self.roaming = roaming
 
-    @property
+    def _all_paths(self):
+        """
+        Compute all application dirs in one pass.
+
+        The platform specific base dirs (e.g. the Windows shell folders) are shared between the four paths, so they
+        are looked up once.
+        """
+        return {
+            'user_data_dir': user_data_dir(self.appname, self.appauthor, version=self.version, roaming=self.roaming),
+            'site_data_dir': site_data_dir(self.appname, self.appauthor, version=self.version),
+            'user_cache_dir': user_cache_dir(self.appname, self.appauthor, version=self.version),
+            'user_log_dir': user_log_dir(self.appname, self.appauthor, version=self.version),
+        }
+
+    @functools.cached_property
+    def _paths(self):
+        return self._all_paths()
+
+    @functools.cached_property
     def user_data_dir(self):
-        return user_data_dir(self.appname, self.appauthor, version=self.version, roaming=self.roaming)
+        return self._paths['user_data_dir']
 
-    @property
+    @functools.cached_property
     def site_data_dir(self):
-        return site_data_dir(self.appname, self.appauthor, version=self.version)
+        return self._paths['site_data_dir']
 
-    @property
+    @functools.cached_property
     def user_cache_dir(self):
-        return user_cache_dir(self.appname, self.appauthor, version=self.version)
+        return self._paths['user_cache_dir']
 
-    @property
+    @functools.cached_property
     def user_log_dir(self):
-        return user_log_dir(self.appname, self.appauthor, version=self.version)
+        return self._paths['user_log_dir']
+
+
+# ---- platform specific implementations
+
+# Base directories taken from the environment of the running platform, see _reset_env_cache(). The Unix
+# implementations format paths from them directly, so `appname` is expected to be a plain name rather than a path.
+_DARWIN_APP_SUPPORT = _DARWIN_CACHES = _DARWIN_LOGS = None
+_XDG_CONFIG_HOME = _XDG_CACHE_HOME = None
+
+# Shell folder of the Windows user data dir, depending on whether it is roaming
+_WIN_USER_DATA_CSIDL = {True: 'CSIDL_APPDATA', False: 'CSIDL_LOCAL_APPDATA'}
+
+# Registry value names and numeric values of the supported CSIDL names
+_SHELL_FOLDER_NAME = {
+    'CSIDL_APPDATA': 'AppData',
+    'CSIDL_COMMON_APPDATA': 'Common AppData',
+    'CSIDL_LOCAL_APPDATA': 'Local AppData',
+}
+_CSIDL_CONST = {
+    'CSIDL_APPDATA': 26,
+    'CSIDL_COMMON_APPDATA': 35,
+    'CSIDL_LOCAL_APPDATA': 28,
+}
+
+
+def _win_app_dir(csidl_name, appauthor, appname, *tail):
+    if appauthor is None:
+        raise AppDirsError('must specify \'appauthor\' on Windows')
+    return _join(_get_win_folder(csidl_name), appauthor, appname, *tail)
+
+
+def _user_data_dir_win(appname, appauthor, version, roaming):
+    return _win_app_dir(_WIN_USER_DATA_CSIDL[bool(roaming)], appauthor, appname, version)
+
+
+def _user_data_dir_darwin(appname, appauthor, version, roaming):  # pylint: disable=unused-argument
+    return _join(_DARWIN_APP_SUPPORT, appname, version)
+
+
+def _user_data_dir_posix(appname, appauthor, version, roaming):  # pylint: disable=unused-argument
+    return _posix_app_dir(_XDG_CONFIG_HOME, appname, version)
+
+
+def _site_data_dir_win(appname, appauthor, version):
+    return _win_app_dir('CSIDL_COMMON_APPDATA', appauthor, appname, version)
+
+
+def _site_data_dir_darwin(appname, appauthor, version):  # pylint: disable=unused-argument
+    return _join('/Library/Application Support', appname, version)
+
+
+def _site_data_dir_posix(appname, appauthor, version):  # pylint: disable=unused-argument
+    # XDG default for $XDG_CONFIG_DIRS[0]. Perhaps should actually *use* that envvar, if defined.
+    return _posix_app_dir('/etc/xdg', appname, version)
+
+
+def _user_cache_dir_win(appname, appauthor, version, opinion):
+    return _win_app_dir('CSIDL_LOCAL_APPDATA', appauthor, appname, opinion and 'Cache', version)
+
+
+def _user_cache_dir_darwin(appname, appauthor, version, opinion):  # pylint: disable=unused-argument
+    return _join(_DARWIN_CACHES, appname, version)
+
+
+def _user_cache_dir_posix(appname, appauthor, version, opinion):  # pylint: disable=unused-argument
+    return _posix_app_dir(_XDG_CACHE_HOME, appname, version)
+
+
+def _user_log_dir_win(appname, appauthor, version, opinion):
+    return _win_app_dir('CSIDL_LOCAL_APPDATA', appauthor, appname, version, opinion and 'Logs')
+
+
+def _user_log_dir_darwin(appname, appauthor, version, opinion):  # pylint: disable=unused-argument
+    return _join(_DARWIN_LOGS, appname, version)
+
+
+def _user_log_dir_posix(appname, appauthor, version, opinion):  # pylint: disable=unused-argument
+    return _posix_app_dir(_XDG_CACHE_HOME, appname, version, opinion and 'log')
 
 
 # ---- internal support stuff
 
+def _join(path, *tail):
+    """Append the non-empty `tail` components to `path` with a single :func:`os.path.join` call."""
+    return os.path.join(path, *(part for part in tail if part))
+
+
+def _posix_app_dir(base, appname, *tail):
+    """Join `base`, the lower-cased `appname` and the non-empty `tail` components with plain string joins."""
+    return '/'.join((base, appname.lower(), *(part for part in tail if part)))
+
+
 def _get_win_folder_from_registry(csidl_name):
     """
     This is a fallback technique at best. I'm not sure if using the registry for this guarantees us the correct answer
@@ -260,17 +341,11 @@ def _get_win_folder_from_registry(csidl_name):
     """
     import _winreg  # pylint: disable=import-error
 
-    shell_folder_name = {
-        'CSIDL_APPDATA': 'AppData',
-        'CSIDL_COMMON_APPDATA': 'Common AppData',
-        'CSIDL_LOCAL_APPDATA': 'Local AppData',
-    }[csidl_name]
-
     key = _winreg.OpenKey(
         _winreg.HKEY_CURRENT_USER,
         r'Software\Microsoft\Windows\CurrentVersion\Explorer\Shell Folders'
     )
-    directory, item_type = _winreg.QueryValueEx(key, shell_folder_name)   # pylint: disable=unused-variable
+    directory, item_type = _winreg.QueryValueEx(key, _SHELL_FOLDER_NAME[csidl_name])   # pylint: disable=unused-variable
     return directory
 
 
@@ -278,49 +353,46 @@ def _get_win_folder_with_pywin32(csidl_name):
     from win32com.shell import shellcon, shell  # pylint: disable=import-error
     directory = shell.SHGetFolderPath(0, getattr(shellcon, csidl_name), 0, 0)
 
-    # Try to make this a unicode path because SHGetFolderPath does not return unicode strings when there is unicode data
-    # in the path.
-    try:
+    # SHGetFolderPath returns a unicode string on Python 3, anything else is converted to one
+    if not isinstance(directory, str):
         directory = str(directory)
 
-        # Downgrade to short path name if have highbit chars. See
-        # <http://bugs.activestate.com/show_bug.cgi?id=85099>.
-        has_high_char = False
-        for char in directory:
-            if ord(char) > 255:
-                has_high_char = True
-                break
-        if has_high_char:
-            try:
-                import win32api
-                directory = win32api.GetShortPathName(directory)
-            except ImportError:
-                pass
-    except UnicodeError:
-        pass
+    # Downgrade to short path name if have highbit chars. See
+    # <http://bugs.activestate.com/show_bug.cgi?id=85099>.
+    if directory and max(directory) > '\xff':
+        try:
+            import win32api
+            directory = win32api.GetShortPathName(directory)
+        except ImportError:
+            pass
     return directory
 
 
-def _get_win_folder_with_ctypes(csidl_name):
+@functools.lru_cache(maxsize=None)
+def _shell32_get_folder_path():
+    """
+    Return ``SHGetFolderPathW`` with its prototype declared, so ctypes does not guess how to convert arguments.
+
+    The prototype is private: the shared ``ctypes.windll.shell32.SHGetFolderPathW`` object used by other callers in the
+    process is left untouched.
+    """
     import ctypes
 
-    csidl_const = {
-        'CSIDL_APPDATA': 26,
-        'CSIDL_COMMON_APPDATA': 35,
-        'CSIDL_LOCAL_APPDATA': 28,
-    }[csidl_name]
+    prototype = ctypes.WINFUNCTYPE(
+        ctypes.c_int32, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_uint32, ctypes.c_wchar_p,
+    )
+    return prototype(('SHGetFolderPathW', ctypes.windll.shell32))
+
+
+def _get_win_folder_with_ctypes(csidl_name):
+    import ctypes
 
     buf = ctypes.create_unicode_buffer(1024)
-    ctypes.windll.shell32.SHGetFolderPathW(None, csidl_const, None, 0, buf)
+    _shell32_get_folder_path()(None, _CSIDL_CONST[csidl_name], None, 0, buf)
 
     # Downgrade to short path name if have highbit chars. See
     # <http://bugs.activestate.com/show_bug.cgi?id=85099>.
-    has_high_char = False
-    for char in buf:
-        if ord(char) > 255:
-            has_high_char = True
-            break
-    if has_high_char:
+    if buf.value and max(buf.value) > '\xff':
         buf2 = ctypes.create_unicode_buffer(1024)
         if ctypes.windll.kernel32.GetShortPathNameW(buf.value, buf2, 1024):
             buf = buf2
@@ -328,16 +400,48 @@ def _get_win_folder_with_ctypes(csidl_name):
     return buf.value
 
 
-if sys.platform == 'win32':
+@functools.lru_cache(maxsize=None)
+def _win_folder_getter():
+    """
+    Pick the available way of looking up Windows shell folders: pywin32, ctypes or, as a last resort, the registry.
+
+    This is done on first use, so the imports are only attempted when a Windows folder is actually needed.
+    """
     try:
         import win32com.shell  # pylint: disable=unused-import
-        _get_win_folder = _get_win_folder_with_pywin32
+        return _get_win_folder_with_pywin32
     except ImportError:
         try:
             import ctypes  # pylint: disable=unused-import
-            _get_win_folder = _get_win_folder_with_ctypes
+            return _get_win_folder_with_ctypes
         except ImportError:
-            _get_win_folder = _get_win_folder_from_registry
+            return _get_win_folder_from_registry
+
+
+# Shell folders do not move while running, so each CSIDL name is resolved at most once
+@functools.lru_cache(maxsize=4)
+def _get_win_folder(csidl_name):
+    return _win_folder_getter()(csidl_name)
+
+
+# The platform does not change while running, so pick the implementations once instead of on every call
+if sys.platform == 'win32':
+    _user_data_dir = _user_data_dir_win
+    _site_data_dir = _site_data_dir_win
+    _user_cache_dir = _user_cache_dir_win
+    _user_log_dir = _user_log_dir_win
+elif sys.platform == 'darwin':
+    _user_data_dir = _user_data_dir_darwin
+    _site_data_dir = _site_data_dir_darwin
+    _user_cache_dir = _user_cache_dir_darwin
+    _user_log_dir = _user_log_dir_darwin
+else:
+    _user_data_dir = _user_data_dir_posix
+    _site_data_dir = _site_data_dir_posix
+    _user_cache_dir = _user_cache_dir_posix
+    _user_log_dir = _user_log_dir_posix
+
+_reset_env_cache()
 
 
 # ---- self test code
@@ -346,15 +450,12 @@ if __name__ == '__main__':
     APP_NAME = 'MyApp'
     APP_AUTHOR = 'MyCompany'
 
-    props = ('user_data_dir', 'site_data_dir', 'user_cache_dir',
-             'user_log_dir')
-
-    print("-- app dirs (without optional 'version')")
+    print("-- app dirs (with optional 'version')")
     dirs = AppDirs(APP_NAME, APP_AUTHOR, version='1.0')
-    for prop in props:
-        print('%s: %s' % (prop, getattr(dirs, prop)))
+    for prop, path in dirs._all_paths().items():  # pylint: disable=protected-access
+        print('%s: %s' % (prop, path))
 
-    print("\n-- app dirs (with optional 'version')")
+    print("\n-- app dirs (without optional 'version')")
     dirs = AppDirs(APP_NAME, APP_AUTHOR)
-    for prop in props:
-        print('%s: %s' % (prop, getattr(dirs, prop)))
+    for prop, path in dirs._all_paths().items():  # pylint: disable=protected-access
+        print('%s: %s' % (prop, path))
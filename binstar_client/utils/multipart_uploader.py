@@ -13,6 +13,7 @@ def multipart_files_upload(
         data: typing.MutableMapping,
         files: typing.Optional[typing.Mapping[str, tuple]] = None,
         progress_bar: typing.Optional['tqdm.tqdm'] = None,
+        session: typing.Optional[requests.Session] = None,
         **request_kwargs: typing.Any) -> requests.Response:
     """
     Uploads one or more files as a multipart form.
@@ -21,6 +22,7 @@ def multipart_files_upload(
     :param data: Dictionary, list of tuples, bytes, or file-like object to send in as a multipart form.
     :param files: Dictionary of ``{'name': file-tuple}`` for multipart encoding upload.
     :param progress_bar: An optional progress bar to display the upload progress.
+    :param session: An optional session to send the request with, so its connections can be reused.
     :param request_kwargs: Any additional keyword arguments to pass to the `requests.post()` function.
 
     """
@@ -34,7 +36,8 @@ def multipart_files_upload(
             encoder, lambda monitor: progress_bar.update(monitor.bytes_read - progress_bar.n)
         )
 
-    return requests.post(
+    post = requests.post if session is None else session.post
+    return post(
         url,
         data=encoder,
         headers={'Content-Type': encoder.content_type},
@@ -59,6 +59,7 @@ class ProjectUploader(binstar_client.Binstar):
                 data=s3data,
                 files={'file': (self.project.basename, self.project.tar)},
                 progress_bar=progress,
+                session=self._storage_session,
                 verify=self.session.verify)
 
         if s3res.status_code != 201:
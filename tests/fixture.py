@@ -5,9 +5,12 @@ Created on Feb 22, 2014
 """
 import io
 import logging
+import os
 import unittest
 from unittest import mock
 
+from binstar_client.utils import appdirs
+
 
 class AnyIO(io.StringIO):  # pylint: disable=missing-class-docstring
 
@@ -18,7 +21,19 @@ class AnyIO(io.StringIO):  # pylint: disable=missing-class-docstring
 
 
 class CLITestCase(unittest.TestCase):  # pylint: disable=too-many-instance-attributes,missing-class-docstring
+    # When set, requests finds this file instead of the user's .netrc in every test of the class
+    netrc_path = None
+
     def setUp(self):
+        if self.netrc_path is not None:
+            # requests.get_netrc_auth uses expanduser to find the netrc file, everything else is expanded as usual
+            expanduser = os.path.expanduser
+            self.expanduser_patch = mock.patch('os.path.expanduser', side_effect=lambda path: (
+                self.netrc_path if path in ('~/.netrc', '~/_netrc') else expanduser(path)
+            ))
+            self.expanduser_patch.start()
+            self.addCleanup(self.expanduser_patch.stop)
+
         self.get_config_patch = mock.patch('binstar_client.utils.get_config')
         self.get_config = self.get_config_patch.start()
         self.get_config.return_value = {}
@@ -47,3 +62,5 @@ class CLITestCase(unittest.TestCase):  # pylint: disable=too-many-instance-attri
         self.store_token_patch.stop()
 
         self.logger.removeHandler(self.hndlr)
+
+        appdirs._clear_caches()  # pylint: disable=protected-access
@@ -2,19 +2,30 @@
 
 from __future__ import unicode_literals
 
+import base64
 import datetime
+import hashlib
+import io
 import json
+import os
+import tempfile
+import time
 import unittest
+from unittest import mock
 from unittest.mock import patch
 
-from binstar_client import errors
+from tqdm import tqdm
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError, SSLError
+
+from binstar_client import Binstar, errors
+from binstar_client.commands.upload import _open_package_file, pathname_list
 from binstar_client.scripts.cli import main
 from tests.fixture import CLITestCase
 from tests.urlmock import urlpatch
 from tests.utils.utils import data_dir
 
 
-class Test(CLITestCase):
+class Test(CLITestCase):  # pylint: disable=too-many-public-methods
     @urlpatch
     def test_upload_bad_package(self, registry):
         registry.register(method='HEAD', path='/', status=200)
@@ -90,6 +101,102 @@ class Test(CLITestCase):
         registry.assertAllCalled()
         self.assertIsNotNone(json.loads(staging_response.req.body).get('sha256'))
 
+    @urlpatch
+    def test_upload_parallel(self, registry):
+        registry.register(method='HEAD', path='/', status=200)
+        registry.register(method='GET', path='/user', content='{"login": "eggs"}')
+        content = {'package_types': ['conda']}
+        registry.register(method='GET', path='/package/eggs/foo', content=content)
+        registry.register(method='GET', path='/package/eggs/mock', content=content)
+        registry.register(method='GET', path='/release/eggs/foo/0.1', content='{}')
+        registry.register(method='GET', path='/release/eggs/mock/2.0.0', content='{}')
+        registry.register(method='GET', path='/dist/eggs/foo/0.1/osx-64/foo-0.1-0.tar.bz2', status=404, content='{}')
+        registry.register(
+            method='GET', path='/dist/eggs/mock/2.0.0/osx-64/mock-2.0.0-py37_1000.conda', status=404, content='{}')
+
+        content = {'post_url': 'http://s3url.com/s3_url', 'form_data': {}, 'dist_id': 'dist_id'}
+        registry.register(method='POST', path='/stage/eggs/foo/0.1/osx-64/foo-0.1-0.tar.bz2', content=content)
+        registry.register(
+            method='POST', path='/stage/eggs/mock/2.0.0/osx-64/mock-2.0.0-py37_1000.conda', content=content)
+
+        registry.register(method='POST', path='/s3_url', status=201)
+        registry.register(method='POST', path='/commit/eggs/foo/0.1/osx-64/foo-0.1-0.tar.bz2', status=200, content={})
+        registry.register(
+            method='POST', path='/commit/eggs/mock/2.0.0/osx-64/mock-2.0.0-py37_1000.conda', status=200, content={})
+
+        main([
+            '--show-traceback', 'upload', '--parallel', '2',
+            data_dir('foo-0.1-0.tar.bz2'), data_dir('mock-2.0.0-py37_1000.conda'),
+        ], False)
+
+        registry.assertAllCalled()
+
+    @urlpatch
+    def test_upload_parallel_same_package(self, registry):
+        registry.register(method='HEAD', path='/', status=200)
+        registry.register(method='GET', path='/user', content='{"login": "eggs"}')
+        package = registry.register(method='GET', path='/package/eggs/foo', status=404, content='{}')
+        new_package = registry.register(method='POST', path='/package/eggs/foo', content={'package_types': []})
+        registry.register(method='GET', path='/release/eggs/foo/0.1', status=404, content='{}')
+        registry.register(method='POST', path='/release/eggs/foo/0.1', content='{}')
+
+        content = {'post_url': 'http://s3url.com/s3_url', 'form_data': {}, 'dist_id': 'dist_id'}
+        for basename in ('foo-0.1-0.tar.bz2', 'test_package34-0.3.1.tar.gz'):
+            registry.register(method='GET', path='/dist/eggs/foo/0.1/{}'.format(basename), status=404, content='{}')
+            registry.register(method='POST', path='/stage/eggs/foo/0.1/{}'.format(basename), content=content)
+            registry.register(method='POST', path='/commit/eggs/foo/0.1/{}'.format(basename), status=200, content={})
+        registry.register(method='POST', path='/s3_url', status=201)
+
+        get_package = Binstar.package
+
+        def slow_package(self, *args, **kwargs):
+            # Give the other worker a chance to look the package up as well, unless it waits for this one
+            time.sleep(0.1)
+            return get_package(self, *args, **kwargs)
+
+        with patch.object(Binstar, 'package', slow_package), patch('binstar_client.tqdm', wraps=tqdm) as progress:
+            main([
+                '--show-traceback', 'upload', '--parallel', '2', '--package-type', 'file', '--package', 'foo',
+                '--version', '0.1', '--summary', 'foo', data_dir('foo-0.1-0.tar.bz2'),
+                data_dir('test_package34-0.3.1.tar.gz'),
+            ], False)
+
+        registry.assertAllCalled()
+        self.assertEqual(package.called, 1)
+        self.assertEqual(new_package.called, 1)
+        self.assertEqual(progress.call_count, 2)
+        self.assertTrue(all(call.kwargs['disable'] for call in progress.call_args_list))
+
+    def test_upload_parallel_negative(self):
+        with self.assertRaises(SystemExit), patch('sys.stderr', new_callable=io.StringIO) as stderr:
+            main(['--show-traceback', 'upload', '--parallel', '-1', data_dir('foo-0.1-0.tar.bz2')], False)
+
+        self.assertIn('expected 0 or a positive number of workers, got -1', stderr.getvalue())
+
+    @urlpatch
+    def test_upload_same_release_lookups_once(self, registry):
+        registry.register(method='HEAD', path='/', status=200)
+        registry.register(method='GET', path='/user', content='{"login": "eggs"}')
+        content = {'package_types': ['file']}
+        package = registry.register(method='GET', path='/package/eggs/foo', content=content)
+        release = registry.register(method='GET', path='/release/eggs/foo/0.1', content='{}')
+
+        content = {'post_url': 'http://s3url.com/s3_url', 'form_data': {}, 'dist_id': 'dist_id'}
+        for basename in ('foo-0.1-0.tar.bz2', 'test_package34-0.3.1.tar.gz'):
+            registry.register(method='GET', path='/dist/eggs/foo/0.1/{}'.format(basename), status=404, content='{}')
+            registry.register(method='POST', path='/stage/eggs/foo/0.1/{}'.format(basename), content=content)
+            registry.register(method='POST', path='/commit/eggs/foo/0.1/{}'.format(basename), status=200, content={})
+        registry.register(method='POST', path='/s3_url', status=201)
+
+        main([
+            '--show-traceback', 'upload', '--package-type', 'file', '--package', 'foo', '--version', '0.1',
+            data_dir('foo-0.1-0.tar.bz2'), data_dir('test_package34-0.3.1.tar.gz'),
+        ], False)
+
+        registry.assertAllCalled()
+        self.assertEqual(package.called, 1)
+        self.assertEqual(release.called, 1)
+
     @urlpatch
     def test_upload_use_pkg_metadata(self, registry):
         registry.register(method='HEAD', path='/', status=200)
@@ -114,6 +221,75 @@ class Test(CLITestCase):
         registry.assertAllCalled()
         self.assertIsNotNone(json.loads(staging_response.req.body).get('sha256'))
 
+    @urlpatch
+    def test_upload_conda_to_incompatible_package(self, registry):
+        registry.register(method='HEAD', path='/', status=200)
+        registry.register(method='GET', path='/user', content='{"login": "eggs"}')
+        content = {'package_types': ['ipynb']}
+        registry.register(method='GET', path='/package/eggs/foo', content=content)
+
+        with self.assertRaises(errors.BinstarError):
+            main(['--show-traceback', 'upload', data_dir('foo-0.1-0.tar.bz2')], False)
+
+        registry.assertAllCalled()
+        self.assertIn("You already have a notebook named 'foo'", self.stream.getvalue())
+
+    @urlpatch
+    def test_upload_notebook_after_conda_to_same_package(self, registry):
+        registry.register(method='HEAD', path='/', status=200)
+        registry.register(method='GET', path='/user', content='{"login": "eggs"}')
+        content = {'package_types': []}
+        registry.register(method='GET', path='/package/eggs/foo', content=content)
+        registry.register(method='GET', path='/release/eggs/foo/0.1', content='{}')
+        registry.register(method='GET', path='/dist/eggs/foo/0.1/osx-64/foo-0.1-0.tar.bz2', status=404, content='{}')
+
+        content = {'post_url': 'http://s3url.com/s3_url', 'form_data': {}, 'dist_id': 'dist_id'}
+        registry.register(method='POST', path='/stage/eggs/foo/0.1/osx-64/foo-0.1-0.tar.bz2', content=content)
+        registry.register(method='POST', path='/s3_url', status=201)
+        registry.register(method='POST', path='/commit/eggs/foo/0.1/osx-64/foo-0.1-0.tar.bz2', status=200, content={})
+
+        with self.assertRaises(errors.BinstarError):
+            main([
+                '--show-traceback', 'upload', '--package', 'foo',
+                data_dir('foo-0.1-0.tar.bz2'), data_dir('foo.ipynb'),
+            ], False)
+
+        registry.assertAllCalled()
+        self.assertIn("You already have a conda named 'foo'", self.stream.getvalue())
+
+    @urlpatch
+    def test_upload_installers_to_same_package(self, registry):
+        registry.register(method='HEAD', path='/', status=200)
+        registry.register(method='GET', path='/user', content='{"login": "eggs"}')
+        content = {'package_types': []}
+        registry.register(method='GET', path='/package/eggs/foo', content=content)
+        registry.register(method='GET', path='/release/eggs/foo/0.1', content='{}')
+        registry.register(method='GET', path='/dist/eggs/foo/0.1/foo-0.1-Linux-x86_64.sh', status=404, content='{}')
+
+        content = {'post_url': 'http://s3url.com/s3_url', 'form_data': {}, 'dist_id': 'dist_id'}
+        registry.register(method='POST', path='/stage/eggs/foo/0.1/foo-0.1-Linux-x86_64.sh', content=content)
+        registry.register(method='POST', path='/s3_url', status=201)
+        registry.register(method='POST', path='/commit/eggs/foo/0.1/foo-0.1-Linux-x86_64.sh', status=200, content={})
+
+        def get_attrs(package_type, filename, **kwargs):  # pylint: disable=unused-argument
+            basename = 'foo-0.1-{}-x86_64.sh'.format('Linux' if filename.endswith('.bz2') else 'MacOSX')
+            return (
+                {'name': 'foo', 'summary': 'Conda installer', 'license': None},
+                {'version': '0.1', 'description': 'Conda installer'},
+                {'basename': basename, 'attrs': {}, 'binstar_package_type': 'file'},
+            )
+
+        # Installers are uploaded as files, so the second one is checked against a "file" package
+        with patch('binstar_client.commands.upload.get_attrs', side_effect=get_attrs), \
+                self.assertRaises(errors.BinstarError):
+            main([
+                '--show-traceback', 'upload', '--package-type', 'installer',
+                data_dir('foo-0.1-0.tar.bz2'), data_dir('foo.ipynb'),
+            ], False)
+
+        registry.assertAllCalled()
+        self.assertIn("You already have a file named 'foo'", self.stream.getvalue())
+
     @urlpatch
     def test_upload_pypi(self, registry):
         registry.register(method='HEAD', path='/', status=200)
@@ -285,6 +461,34 @@ class Test(CLITestCase):
         registry.assertAllCalled()
         self.assertIsNotNone(json.loads(staging_response.req.body).get('sha256'))
 
+    @urlpatch
+    def test_upload_invalid_notebook(self, registry):
+        registry.register(method='HEAD', path='/', status=200)
+        registry.register(method='GET', path='/user', content='{"login": "eggs"}')
+
+        for content in ('{"cells": [', '[]', '"notebook"'):
+            with self.subTest(content=content), tempfile.TemporaryDirectory() as directory:
+                filename = os.path.join(directory, 'invalid.ipynb')
+                with open(filename, 'wt', encoding='utf-8') as stream:
+                    stream.write(content)
+
+                main(['--show-traceback', 'upload', filename], False)
+
+                registry.assertAllCalled()
+                self.assertIn("Invalid notebook file '{}'".format(filename), self.stream.getvalue())
+
+    @urlpatch
+    def test_upload_notebook_missing_thumbnail(self, registry):
+        registry.register(method='HEAD', path='/', status=200)
+        registry.register(method='GET', path='/user', content='{"login": "eggs"}')
+
+        with self.assertRaises(errors.BinstarError):
+            main(['upload', '--thumbnail', data_dir('missing.png'), data_dir('foo.ipynb')], False)
+
+        registry.assertAllCalled()
+        self.assertIn('Trouble reading metadata', self.stream.getvalue())
+        self.assertNotIn('Invalid notebook file', self.stream.getvalue())
+
     @urlpatch
     def test_upload_project_specifying_user(self, registry):
         registry.register(method='HEAD', path='/', status=200)
@@ -372,6 +576,86 @@ class Test(CLITestCase):
         with self.assertRaises(errors.BinstarError):
             main(['--show-traceback', 'upload', '--private', data_dir('foo-0.1-0.tar.bz2')], False)
 
+    def test_open_empty_package_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'empty.txt')
+            with open(filename, 'wb'):
+                pass
+
+            with self.assertRaises(errors.BinstarError) as context:
+                with _open_package_file(filename) as file:
+                    self.assertEqual(file.read(), b'')
+                    raise errors.BinstarError('upload failed')
+
+        self.assertIsNone(context.exception.__context__)
+
+    def test_pathname_list_windows(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for filename in ('a-1.conda', 'b-1.conda', 'b-1.tar.bz2', '.hidden.conda'):
+                with open(os.path.join(directory, filename), 'wb'):
+                    pass
+
+            with patch('binstar_client.commands.upload.os.name', 'nt'):
+                self.assertEqual(
+                    sorted(pathname_list(os.path.join(directory, '*.conda'))),
+                    [os.path.join(directory, 'a-1.conda'), os.path.join(directory, 'b-1.conda')],
+                )
+                self.assertEqual(
+                    pathname_list(os.path.join(directory, 'b-?.tar.bz2')),
+                    [os.path.join(directory, 'b-1.tar.bz2')],
+                )
+                self.assertEqual(pathname_list(os.path.join(directory, 'missing', '*.conda')), [])
+
+            with patch('binstar_client.commands.upload.os.name', 'posix'):
+                self.assertEqual(
+                    pathname_list(os.path.join(directory, '*.conda')), [os.path.join(directory, '*.conda')])
+
+    @urlpatch
+    def test_upload_stream(self, registry):
+        content = b'0123456789' * 1000
+        stream = io.BufferedReader(io.BytesIO(content))
+        stream.seekable = lambda: False
+
+        staging_response = registry.register(
+            method='POST', path='/stage/eggs/foo/0.1/foo-0.1.txt',
+            content={'post_url': 'http://s3url.com/s3_url', 'form_data': {}, 'dist_id': 'dist_id'},
+        )
+        registry.register(method='POST', path='/commit/eggs/foo/0.1/foo-0.1.txt', status=200, content={})
+
+        uploaded = {}
+
+        def upload(url, data, files, progress, **kwargs):  # pylint: disable=unused-argument
+            uploaded['data'] = dict(data)
+            uploaded['content'] = files['file'][1].read()
+            return mock.Mock(status_code=201)
+
+        with patch('binstar_client.multipart_files_upload', side_effect=upload):
+            Binstar().upload('eggs', 'foo', '0.1', 'foo-0.1.txt', stream, 'file')
+
+        registry.assertAllCalled()
+        self.assertEqual(uploaded['content'], content)
+        self.assertEqual(uploaded['data']['Content-Length'], str(len(content)))
+        self.assertEqual(
+            uploaded['data']['Content-MD5'], base64.b64encode(hashlib.md5(content).digest()).decode('ascii'))  # nosec
+        self.assertEqual(json.loads(staging_response.req.body)['sha256'], hashlib.sha256(content).hexdigest())
+
+    def test_retry_only_connection_errors(self):
+        for session in (Binstar().session, Binstar()._storage_session):  # pylint: disable=protected-access
+            retry = session.get_adapter('https://api.anaconda.org').max_retries
+
+            self.assertIsNot(retry.increment('GET', '/', error=ConnectTimeoutError()), retry)
+            with self.assertRaises(MaxRetryError):
+                retry.increment('GET', '/', error=SSLError('handshake failure'))
+
+    @urlpatch
+    def test_upload_missing_file(self, registry):
+        registry.register(method='HEAD', path='/', status=200)
+        registry.register(method='GET', path='/user', content='{"login": "eggs"}')
+
+        with self.assertRaises(errors.BinstarError):
+            main(['--show-traceback', 'upload', data_dir('foo-0.1-0.tar.bz2'), data_dir('absent-0.1-0.tar.bz2')],
+                 False)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -15,6 +15,7 @@ from unittest import mock
 
 import requests.utils
 
+from binstar_client import Binstar
 from binstar_client.scripts.cli import main
 from tests.fixture import CLITestCase
 from tests.urlmock import urlpatch
@@ -40,6 +41,18 @@ class Test(CLITestCase):
 
         user.assertCalled()
 
+    def test_netrc_not_parsed(self):
+        api = Binstar()
+        with mock.patch('requests.sessions.get_netrc_auth') as get_netrc_auth:
+            for session in (api.session, api._storage_session):  # pylint: disable=protected-access
+                request = session.prepare_request(requests.Request('POST', 'https://storage.example.com/'))
+                self.assertNotIn('Authorization', request.headers)
+        get_netrc_auth.assert_not_called()
+
+
+class NetrcTest(CLITestCase):
+    netrc_path = data_dir('netrc')
+
     @urlpatch
     def test_netrc_ignored(self, urls):
         # Disable token authentication
@@ -47,10 +60,7 @@ class Test(CLITestCase):
         os.environ.pop('BINSTAR_API_TOKEN', None)
         os.environ.pop('ANACONDA_API_TOKEN', None)
 
-        # requests.get_netrc_auth uses expanduser to find the netrc file, point to our test file
-        expanduser = mock.Mock(return_value=data_dir('netrc'))
-        with mock.patch('os.path.expanduser', expanduser):
-            auth = requests.utils.get_netrc_auth('http://localhost', raise_errors=True)
+        auth = requests.utils.get_netrc_auth('http://localhost', raise_errors=True)
         self.assertEqual(auth, ('anonymous', 'pass'))
 
         user = urls.register(path='/user', status=401)
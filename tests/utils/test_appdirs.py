@@ -0,0 +1,97 @@
+# pylint: disable=missing-module-docstring,missing-class-docstring,missing-function-docstring,protected-access
+
+import ctypes
+import os
+import sys
+import unittest
+from unittest import mock
+
+from binstar_client.utils import appdirs
+
+
+@unittest.skipIf(sys.platform in ('darwin', 'win32'), 'XDG directories are not used on this platform')
+class XdgTestCase(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(appdirs._reset_env_cache)
+
+    def test_user_data_dir(self):
+        with mock.patch.dict(os.environ, {'XDG_CONFIG_HOME': '/xdg/config'}):
+            appdirs._reset_env_cache()
+            self.assertEqual(appdirs.user_data_dir('MyApp', 'MyCompany', version='1.0'), '/xdg/config/myapp/1.0')
+
+    def test_user_log_dir(self):
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': '/xdg/cache'}):
+            appdirs._reset_env_cache()
+            self.assertEqual(appdirs.user_log_dir('MyApp', 'MyCompany', version='1.0'), '/xdg/cache/myapp/1.0/log')
+
+    def test_cached(self):
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': '/xdg/cache'}):
+            appdirs._reset_env_cache()
+            self.assertEqual(appdirs.user_cache_dir('MyApp', 'MyCompany'), '/xdg/cache/myapp')
+
+        self.assertEqual(appdirs.user_cache_dir('MyApp', 'MyCompany'), '/xdg/cache/myapp')
+        appdirs._reset_env_cache()
+        self.assertNotEqual(appdirs.user_cache_dir('MyApp', 'MyCompany'), '/xdg/cache/myapp')
+
+    def test_app_dirs(self):
+        with mock.patch.dict(os.environ, {'XDG_CONFIG_HOME': '/xdg/config', 'XDG_CACHE_HOME': '/xdg/cache'}):
+            appdirs._reset_env_cache()
+            dirs = appdirs.AppDirs('MyApp', 'MyCompany', version='1.0')
+
+            self.assertEqual(dirs._all_paths(), {
+                'user_data_dir': '/xdg/config/myapp/1.0',
+                'site_data_dir': '/etc/xdg/myapp/1.0',
+                'user_cache_dir': '/xdg/cache/myapp/1.0',
+                'user_log_dir': '/xdg/cache/myapp/1.0/log',
+            })
+            self.assertEqual(dirs.user_log_dir, '/xdg/cache/myapp/1.0/log')
+
+
+class WinFolderTestCase(unittest.TestCase):
+    def setUp(self):
+        appdirs._clear_caches()
+        self.addCleanup(appdirs._clear_caches)
+
+    @mock.patch('binstar_client.utils.appdirs._win_folder_getter')
+    def test_cached(self, win_folder_getter):
+        win_folder_getter.return_value = get_folder = mock.Mock(side_effect=lambda csidl_name: 'C:\\' + csidl_name)
+
+        self.assertEqual(appdirs._get_win_folder('CSIDL_APPDATA'), 'C:\\CSIDL_APPDATA')
+        self.assertEqual(appdirs._get_win_folder('CSIDL_APPDATA'), 'C:\\CSIDL_APPDATA')
+        self.assertEqual(appdirs._get_win_folder('CSIDL_LOCAL_APPDATA'), 'C:\\CSIDL_LOCAL_APPDATA')
+
+        self.assertEqual(get_folder.call_args_list, [mock.call('CSIDL_APPDATA'), mock.call('CSIDL_LOCAL_APPDATA')])
+
+    @mock.patch('ctypes.windll', create=True)
+    @mock.patch('ctypes.WINFUNCTYPE', create=True)
+    def test_ctypes(self, winfunctype, windll):
+        def sh_get_folder_path(hwnd, csidl, token, flags, buf):  # pylint: disable=unused-argument,too-many-arguments
+            buf.value = 'C:\\Users\\me\\AppData\\Local' if csidl == 28 else ''
+            return 0
+
+        winfunctype.return_value.return_value = sh_get_folder_path
+
+        self.assertEqual(appdirs._get_win_folder_with_ctypes('CSIDL_LOCAL_APPDATA'), 'C:\\Users\\me\\AppData\\Local')
+        self.assertEqual(winfunctype.call_args.args[-1], ctypes.c_wchar_p)
+        winfunctype.return_value.assert_called_once_with(('SHGetFolderPathW', windll.shell32))
+        self.assertNotIn('argtypes', vars(windll.shell32.SHGetFolderPathW))
+        windll.kernel32.GetShortPathNameW.assert_not_called()
+
+    def test_pywin32(self):
+        directory = 'C:\\Users\\\u0416\\AppData\\Local'
+        short_directory = 'C:\\Users\\0416~1\\AppData\\Local'
+
+        win32com = mock.Mock()
+        win32com.shell.shell.SHGetFolderPath.return_value = directory
+        win32api = mock.Mock()
+        win32api.GetShortPathName.return_value = short_directory
+
+        modules = {'win32com': win32com, 'win32com.shell': win32com.shell, 'win32api': win32api}
+        with mock.patch.dict(sys.modules, modules):
+            self.assertEqual(appdirs._get_win_folder_with_pywin32('CSIDL_LOCAL_APPDATA'), short_directory)
+
+        win32api.GetShortPathName.assert_called_once_with(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+# pylint: disable=missing-module-docstring,missing-class-docstring,missing-function-docstring
+
+import base64
+import hashlib
+import io
+from unittest import mock
+
+from requests_toolbelt import MultipartEncoder
+
+from binstar_client.utils import bool_input, compute_hash, compute_hashes, HashingFileWrapper, MappedFile, spool_file
+
+CONTENT = b'0123456789' * 100_000
+
+
+class Stream(io.RawIOBase):
+    def __init__(self, content):
+        self.source = io.BytesIO(content)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self.source.readinto(buffer)
+
+
+def test_compute_hash():
+    file = io.BytesIO(CONTENT)
+    file.seek(10)
+
+    hex_digest, base64_digest, data_size = compute_hash(file)
+
+    expected = hashlib.md5(CONTENT[10:])  # nosec
+    assert hex_digest == expected.hexdigest()  # nosec
+    assert base64_digest == base64.b64encode(expected.digest()).decode('ascii')  # nosec
+    assert data_size == len(CONTENT) - 10  # nosec
+    assert file.tell() == 10  # nosec
+
+
+def test_compute_hash_size():
+    file = io.BytesIO(CONTENT)
+
+    hex_digest, _, data_size = compute_hash(file, buf_size=4096, size=10_000, hash_algorithm=hashlib.sha256)
+
+    assert hex_digest == hashlib.sha256(CONTENT[:10_000]).hexdigest()  # nosec
+    assert data_size == 10_000  # nosec
+    assert file.tell() == 0  # nosec
+
+
+def test_compute_hashes():
+    file = io.BytesIO(CONTENT)
+
+    ((hex_sha256, _), (hex_md5, _)), data_size = compute_hashes(file, (hashlib.sha256, hashlib.md5))
+
+    assert hex_sha256 == hashlib.sha256(CONTENT).hexdigest()  # nosec
+    assert hex_md5 == hashlib.md5(CONTENT).hexdigest()  # nosec
+    assert data_size == len(CONTENT)  # nosec
+    assert file.tell() == 0  # nosec
+
+
+def test_compute_hash_file(tmp_path):
+    path = tmp_path / 'file.bin'
+    path.write_bytes(CONTENT)
+
+    with open(path, 'rb') as file:
+        hex_digest, _, data_size = compute_hash(file)
+
+    assert hex_digest == hashlib.md5(CONTENT).hexdigest()  # nosec
+    assert data_size == len(CONTENT)  # nosec
+
+
+def test_compute_hash_mapped_file(tmp_path):
+    path = tmp_path / 'file.bin'
+    path.write_bytes(CONTENT)
+
+    with open(path, 'rb') as file, MappedFile(file) as mapped_file:
+        mapped_file.seek(10)
+        hex_digest, _, data_size = compute_hash(mapped_file, buf_size=4096, size=100_000)
+
+        assert hex_digest == hashlib.md5(CONTENT[10:100_010]).hexdigest()  # nosec
+        assert data_size == 100_000  # nosec
+        assert mapped_file.tell() == 10  # nosec
+
+
+def test_mapped_file_multipart(tmp_path):
+    path = tmp_path / 'file.bin'
+    path.write_bytes(CONTENT)
+
+    with open(path, 'rb') as file, MappedFile(file) as mapped_file:
+        encoder = MultipartEncoder({'file': ('file.bin', mapped_file)})
+        body = encoder.read()
+
+    assert CONTENT in body  # nosec
+    assert len(body) == encoder.len  # nosec
+
+
+def test_hashing_file_wrapper():
+    wrapper = HashingFileWrapper(io.BytesIO(CONTENT), (hashlib.sha256, hashlib.md5))
+
+    assert wrapper.read(10) + wrapper.read() == CONTENT  # nosec
+    assert wrapper.read() == b''  # nosec
+
+    (hex_sha256, _), (hex_md5, b64_md5) = wrapper.digests()
+    assert hex_sha256 == hashlib.sha256(CONTENT).hexdigest()  # nosec
+    assert hex_md5 == hashlib.md5(CONTENT).hexdigest()  # nosec
+    assert b64_md5 == base64.b64encode(hashlib.md5(CONTENT).digest()).decode('ascii')  # nosec
+
+
+def test_spool_file():
+    stream = Stream(CONTENT)
+    assert not stream.seekable()  # nosec
+
+    spooled, ((hex_md5, _),), size = spool_file(stream, (hashlib.md5,), buf_size=4096, max_size=1024)
+    with spooled:
+        assert spooled.tell() == 0  # nosec
+        assert spooled.read() == CONTENT  # nosec
+
+    assert hex_md5 == hashlib.md5(CONTENT).hexdigest()  # nosec
+    assert size == len(CONTENT)  # nosec
+
+
+def test_spool_file_multipart():
+    spooled, _, _ = spool_file(Stream(CONTENT), (hashlib.md5,))
+    with spooled:
+        encoder = MultipartEncoder({'file': ('file.bin', spooled)})
+        body = encoder.read()
+
+        assert not spooled.content._rolled  # nosec  # pylint: disable=protected-access
+
+    assert CONTENT in body  # nosec
+    assert len(body) == encoder.len  # nosec
+
+
+@mock.patch('binstar_client.utils.input')
+def test_bool_input(mock_input):
+    for answers, default, expected in (
+            ([''], True, True),
+            ([''], False, False),
+            (['y'], False, True),
+            (['Yes'], False, True),
+            (['n'], True, False),
+            (['maybe', ' NO '], True, False),
+    ):
+        mock_input.side_effect = answers
+        assert bool_input('Continue?', default) is expected  # nosec